@@ -22,11 +22,13 @@ from .quant_utils import (
     ONNX_TYPE_TO_NP_TYPE,
     TENSOR_NAME_QUANT_SUFFIX,
     QuantType,
+    build_quantizer,
     find_by_name,
     model_has_infer_metadata,
     normalize_axis,
     pack_bytes_to_4bit,
     quantize_data,
+    quantize_data_per_channel,
     quantize_nparray,
     save_and_reload_model_with_shape_infer,
     tensor_proto_to_array,
@@ -415,58 +417,77 @@ class BaseQuantizer:
             ),
         )
         reduce_range = quant_overrides_for_channels[0].get("reduce_range", self.reduce_range and reduce_range)
-        zero_point_list = []
-        scale_list = []
-        quantized_per_channel_data_list = []
         weights_shape = list(weights.shape)
-        reshape_dims = list(weights_shape)  # deep copy
-        reshape_dims[channel_axis] = 1  # only one per channel for reshape
-        for i in range(channel_count):
-            per_channel_data = weights.take(i, channel_axis)
-            channel_override_index = i if i < num_channel_overrides else 0
-            channel_quant_overrides = quant_overrides_for_channels[channel_override_index]
-
-            if "scale" in channel_quant_overrides and "zero_point" in channel_quant_overrides:
-                zero_point = np.array(channel_quant_overrides["zero_point"], dtype=ONNX_TYPE_TO_NP_TYPE[weight_qType])
-                scale = np.array(channel_quant_overrides["scale"])
-                quantized_per_channel_data = quantize_nparray(
-                    weight_qType, per_channel_data.flatten(), scale, zero_point
-                )
-                assert isinstance(zero_point, np.ndarray), f"Unexpected type {type(zero_point)}"
-                assert (
-                    zero_point.dtype != np.float32 and zero_point.dtype != np.float16
-                ), f"Unexpected dtype {zero_point.dtype}"
-                assert isinstance(scale, np.ndarray), f"Unexpected type {type(scale)}"
-                assert isinstance(
-                    quantized_per_channel_data, np.ndarray
-                ), f"Unexpected type {type(quantized_per_channel_data)}"
+        if (
+            weight_qType != onnx.TensorProto.FLOAT8E4M3FN
+            and not any(key in quant_overrides_for_channels[0] for key in ("scale", "zero_point", "rmin", "rmax"))
+            and num_channel_overrides == 1
+        ):
+            # The quantization parameters are not overridden per channel: quantize all channels at once.
+            _, _, zero_points, scales, quantized_weights = quantize_data_per_channel(
+                weights,
+                channel_axis,
+                weight_qType,
+                symmetric,
+                reduce_range=reduce_range,
+                min_real_range=self.min_real_range,
+            )
+            zero_point_list = [zero_points]
+            scale_list = [scales]
+        else:
+            zero_point_list = []
+            scale_list = []
+            quantized_per_channel_data_list = []
+            reshape_dims = list(weights_shape)  # deep copy
+            reshape_dims[channel_axis] = 1  # only one per channel for reshape
+            quantize_channel = build_quantizer(weight_qType)
+            for i in range(channel_count):
+                per_channel_data = weights.take(i, channel_axis)
+                channel_override_index = i if i < num_channel_overrides else 0
+                channel_quant_overrides = quant_overrides_for_channels[channel_override_index]
+
+                if "scale" in channel_quant_overrides and "zero_point" in channel_quant_overrides:
+                    zero_point = np.array(
+                        channel_quant_overrides["zero_point"], dtype=ONNX_TYPE_TO_NP_TYPE[weight_qType]
+                    )
+                    scale = np.array(channel_quant_overrides["scale"])
+                    quantized_per_channel_data = quantize_channel(per_channel_data.flatten(), scale, zero_point)
+                    assert isinstance(zero_point, np.ndarray), f"Unexpected type {type(zero_point)}"
+                    assert (
+                        zero_point.dtype != np.float32 and zero_point.dtype != np.float16
+                    ), f"Unexpected dtype {zero_point.dtype}"
+                    assert isinstance(scale, np.ndarray), f"Unexpected type {type(scale)}"
+                    assert isinstance(
+                        quantized_per_channel_data, np.ndarray
+                    ), f"Unexpected type {type(quantized_per_channel_data)}"
+
+                else:
+                    _, _, zero_point, scale, quantized_per_channel_data = quantize_data(
+                        per_channel_data.flatten(),
+                        weight_qType,
+                        symmetric,
+                        reduce_range=reduce_range,
+                        min_real_range=self.min_real_range,
+                        rmin_override=channel_quant_overrides.get("rmin"),
+                        rmax_override=channel_quant_overrides.get("rmax"),
+                    )
 
-            else:
-                _, _, zero_point, scale, quantized_per_channel_data = quantize_data(
-                    per_channel_data.flatten(),
-                    weight_qType,
-                    symmetric,
-                    reduce_range=reduce_range,
-                    min_real_range=self.min_real_range,
-                    rmin_override=channel_quant_overrides.get("rmin"),
-                    rmax_override=channel_quant_overrides.get("rmax"),
-                )
+                    assert isinstance(zero_point, np.ndarray), f"Unexpected type {type(zero_point)}"
+                    assert (
+                        zero_point.dtype != np.float32 and zero_point.dtype != np.float16
+                    ), f"Unexpected dtype {zero_point.dtype}"
+                    assert isinstance(scale, np.ndarray), f"Unexpected type {type(scale)}"
+                    assert isinstance(
+                        quantized_per_channel_data, np.ndarray
+                    ), f"Unexpected type {type(quantized_per_channel_data)}"
+
+                zero_point_list.append(zero_point)
+                scale_list.append(scale)
+                quantized_per_channel_data_list.append(np.asarray(quantized_per_channel_data).reshape(reshape_dims))
+
+            # combine per_channel_data into one
+            quantized_weights = np.concatenate(quantized_per_channel_data_list, channel_axis)
 
-                assert isinstance(zero_point, np.ndarray), f"Unexpected type {type(zero_point)}"
-                assert (
-                    zero_point.dtype != np.float32 and zero_point.dtype != np.float16
-                ), f"Unexpected dtype {zero_point.dtype}"
-                assert isinstance(scale, np.ndarray), f"Unexpected type {type(scale)}"
-                assert isinstance(
-                    quantized_per_channel_data, np.ndarray
-                ), f"Unexpected type {type(quantized_per_channel_data)}"
-
-            zero_point_list.append(zero_point)
-            scale_list.append(scale)
-            quantized_per_channel_data_list.append(np.asarray(quantized_per_channel_data).reshape(reshape_dims))
-
-        # combine per_channel_data into one
-        quantized_weights = np.concatenate(quantized_per_channel_data_list, channel_axis)
         q_weight_name = weight_name + TENSOR_NAME_QUANT_SUFFIX
         zp_name = weight_name + "_zero_point"
         scale_name = weight_name + "_scale"
@@ -53,6 +53,7 @@ from .quant_utils import (
     DEQUANT_OUTPUT_SUFFIX,
     QUANT_INPUT_SUFFIX,
     TENSOR_NAME_QUANT_SUFFIX,
+    build_name_index,
     find_by_name,
     load_model_with_shape_infer,
 )
@@ -289,7 +290,8 @@ def create_weight_matching(float_model_path: str, qdq_model_path: str) -> Dict[s
     qdq_onnx_model = ONNXModel(load_model_with_shape_infer(Path(qdq_model_path)))
 
     matched_weights: Dict[str, Dict[str, numpy.ndarray]] = {}
-    initializers = qdq_onnx_model.initializer()
+    initializers = build_name_index(qdq_onnx_model.initializer())
+    float_initializers = build_name_index(float_onnx_model.initializer())
     for node in qdq_onnx_model.nodes():
         if node.op_type != DEQUANT_OP_NAME:
             continue  # Only care about DQ node
@@ -328,7 +330,7 @@ def create_weight_matching(float_model_path: str, qdq_model_path: str) -> Dict[s
             logging.error(f"Model Error in '{qdq_model_path}': '{weight_name}' per-channel quantization on 0 channel")
             continue
 
-        float_values = find_by_name(weight_name, float_onnx_model.initializer())
+        float_values = find_by_name(weight_name, float_initializers)
         if not float_values:
             logging.error(f"Model Error in '{float_model_path}': weight tensor '{weight_name}' not found!")
             continue
@@ -5,8 +5,11 @@
 # --------------------------------------------------------------------------
 from __future__ import annotations
 
+import json
 import logging
+import mmap
 import os
+import sys
 import tempfile
 from enum import Enum
 from pathlib import Path
@@ -15,8 +18,6 @@ import numpy
 import onnx
 from onnx import ModelProto, TensorProto, external_data_helper
 from onnx import onnx_pb as onnx_proto
-from onnx.helper import make_graph, make_model, make_node, make_tensor_value_info
-from onnx.reference import ReferenceEvaluator
 
 from onnxruntime import GraphOptimizationLevel, InferenceSession, SessionOptions
 
@@ -33,6 +34,24 @@ except ImportError:
     int4 = None
     uint4 = None
 
+try:
+    from onnx.helper import float32_to_float8e4m3
+
+    # Same element-wise conversion as the reference implementation of QuantizeLinear.
+    _vect_float32_to_float8e4m3 = numpy.vectorize(float32_to_float8e4m3, otypes=[numpy.uint8])
+except ImportError:
+    _vect_float32_to_float8e4m3 = None
+
+# numba is optional and only imported by _get_quantize_kernel when the numba kernel is enabled.
+numba = None
+
+try:
+    import flatbuffers
+
+    from .CalTableFlatBuffers import KeyValue, TrtTable
+except ImportError:
+    flatbuffers = None
+
 
 __producer__ = "onnx.quantize"
 __version__ = "0.1.0"
@@ -45,6 +64,7 @@ DEQUANT_OUTPUT_SUFFIX = "_DequantizeLinear_Output"
 TENSOR_NAME_QUANT_SUFFIX = "_quantized"
 
 FLOAT8_DISTRIBUTIONS = {}
+FLOAT8_STDS = {}
 
 type_to_name = {getattr(TensorProto, k): k for k in dir(TensorProto) if isinstance(getattr(TensorProto, k), int)}
 
@@ -62,10 +82,13 @@ class QuantizationMode(Enum):
 
     @staticmethod
     def from_string(mode):
-        try:
-            return QuantizationMode[mode]
-        except KeyError:
-            raise ValueError()  # noqa: B904
+        member = _QUANTIZATION_MODE_BY_NAME.get(mode)
+        if member is None:
+            raise ValueError()
+        return member
+
+
+_QUANTIZATION_MODE_BY_NAME = dict(QuantizationMode.__members__)
 
 
 class QuantizedValueType(Enum):
@@ -77,10 +100,13 @@ class QuantizedValueType(Enum):
 
     @staticmethod
     def from_string(v):
-        try:
-            return QuantizedValueType[v]
-        except KeyError:
-            raise ValueError()  # noqa: B904
+        member = _QUANTIZED_VALUE_TYPE_BY_NAME.get(v)
+        if member is None:
+            raise ValueError()
+        return member
+
+
+_QUANTIZED_VALUE_TYPE_BY_NAME = dict(QuantizedValueType.__members__)
 
 
 class QuantType(Enum):
@@ -97,10 +123,10 @@ class QuantType(Enum):
 
     @staticmethod
     def from_string(t):
-        try:
-            return QuantType[t]
-        except KeyError:
-            raise ValueError()  # noqa: B904
+        member = _QUANT_TYPE_BY_NAME.get(t)
+        if member is None:
+            raise ValueError()
+        return member
 
     @property
     def tensor_type(self):
@@ -121,6 +147,9 @@ class QuantType(Enum):
         raise ValueError(f"Unexpected value qtype={self!r}.")
 
 
+_QUANT_TYPE_BY_NAME = dict(QuantType.__members__)
+
+
 class QuantFormat(Enum):
     QOperator = 0
     QDQ = 1
@@ -130,10 +159,13 @@ class QuantFormat(Enum):
 
     @staticmethod
     def from_string(format):
-        try:
-            return QuantFormat[format]
-        except KeyError:
-            raise ValueError()  # noqa: B904
+        member = _QUANT_FORMAT_BY_NAME.get(format)
+        if member is None:
+            raise ValueError()
+        return member
+
+
+_QUANT_FORMAT_BY_NAME = dict(QuantFormat.__members__)
 
 
 ONNX_TYPE_TO_NP_TYPE = {
@@ -169,6 +201,20 @@ ONNX_INT_TYPE_REDUCED_RANGE = {
     onnx_proto.TensorProto.INT4: (numpy.array(-4, dtype=int4), numpy.array(3, dtype=int4)),
 }
 
+# (qType, reduce_range, symmetric) -> (qmin, qmax), flattened from the range tables above.
+_QMIN_QMAX_TABLE = {
+    **{
+        (qType, False, symmetric): ONNX_INT_TYPE_SYMMETRIC_RANGE.get(qType, qrange) if symmetric else qrange
+        for qType, qrange in ONNX_INT_TYPE_RANGE.items()
+        for symmetric in (False, True)
+    },
+    **{
+        (qType, True, symmetric): qrange
+        for qType, qrange in ONNX_INT_TYPE_REDUCED_RANGE.items()
+        for symmetric in (False, True)
+    },
+}
+
 
 def _check_type(*args, zero_point_index=-1):
     new_args = []
@@ -186,7 +232,108 @@ def _check_type(*args, zero_point_index=-1):
     return tuple(new_args) if len(new_args) > 1 else new_args[0]
 
 
-def quantize_nparray(qType, arr, scale, zero_point, low=None, high=None):
+def _quantize_loop(data, scale, zero_point, qmin, qmax, out):
+    # Fused divide/round/add/clip/cast over flattened float32 data, compiled by
+    # _get_quantize_kernel. Numba specializes it for each output dtype (int8, uint8, int16, uint16).
+    for i in numba.prange(data.shape[0]):
+        out[i] = min(max(numpy.rint(data[i] / scale) + zero_point, qmin), qmax)
+
+
+# Compiled _quantize_loop, False until _get_quantize_kernel is called, None if numba is not available.
+_quantize_kernel = False
+
+
+def _get_quantize_kernel():
+    """
+    Returns the numba kernel used by quantize_nparray for large tensors with a single scale and
+    zero point, or None. The kernel is opt-in (environment variable ORT_QUANTIZATION_USE_NUMBA=1),
+    numba is only imported then and the compiled kernel is cached on disk.
+    """
+    global _quantize_kernel, numba  # noqa: PLW0603
+    if os.environ.get("ORT_QUANTIZATION_USE_NUMBA", 0) not in (1, "1"):
+        return None
+    if _quantize_kernel is False:
+        try:
+            import numba
+        except ImportError:
+            _quantize_kernel = None
+        else:
+            _quantize_kernel = numba.njit(parallel=True, cache=True)(_quantize_loop)
+    return _quantize_kernel
+
+
+# Types handled by the numba kernel and the minimum number of elements for which
+# the parallel kernel outperforms the numpy implementation.
+_NUMBA_QUANT_TYPES = (
+    onnx_proto.TensorProto.INT8,
+    onnx_proto.TensorProto.UINT8,
+    onnx_proto.TensorProto.INT16,
+    onnx_proto.TensorProto.UINT16,
+)
+_NUMBA_MIN_SIZE = 1 << 14
+
+
+def _quantize_nparray_numba(kernel, arr, scale, zero_point, cliplow, cliphigh, dtype):
+    quantized = numpy.empty(arr.shape, dtype=dtype)
+    kernel(
+        arr.astype(numpy.float32, copy=False).ravel(),
+        numpy.float32(scale),
+        numpy.float32(zero_point),
+        numpy.float32(cliplow),
+        numpy.float32(cliphigh),
+        quantized.reshape(-1),
+    )
+    return quantized
+
+
+# Float 8 conversion tables indexed by the bit pattern of the input, built once per input dtype.
+_FP8_TABLES = {}
+
+
+def _to_float8e4m3(values: numpy.ndarray) -> numpy.ndarray:
+    if values.dtype != numpy.float16:
+        return _vect_float32_to_float8e4m3(values)
+    # Every float16 value has an exact float32 representation, a table over the 65536
+    # bit patterns gives the same result as converting each element.
+    table = _FP8_TABLES.get(values.dtype)
+    if table is None:
+        with numpy.errstate(invalid="ignore"):
+            table = _vect_float32_to_float8e4m3(numpy.arange(1 << 16, dtype=numpy.uint16).view(numpy.float16))
+        _FP8_TABLES[values.dtype] = table
+    return table[values.view(numpy.uint16)]
+
+
+# Number of elements reduced at once by _min_max, small enough for a block to stay in cache.
+_MIN_MAX_BLOCK_SIZE = 1 << 18
+
+
+def _min_max(data):
+    if data.size <= _MIN_MAX_BLOCK_SIZE:
+        return (data.min(), data.max()) if data.size else (0.0, 0.0)
+    # Both reductions run on the same block while it is still in cache, large weights are
+    # only read once from memory instead of once for the minimum and once for the maximum.
+    flat = data.ravel()
+    n_blocks = -(-flat.size // _MIN_MAX_BLOCK_SIZE)
+    block_mins = numpy.empty(n_blocks, dtype=flat.dtype)
+    block_maxs = numpy.empty(n_blocks, dtype=flat.dtype)
+    for i in range(n_blocks):
+        block = flat[i * _MIN_MAX_BLOCK_SIZE : (i + 1) * _MIN_MAX_BLOCK_SIZE]
+        block_mins[i] = block.min()
+        block_maxs[i] = block.max()
+    return block_mins.min(), block_maxs.max()
+
+
+def build_quantizer(qType, low=None, high=None):
+    """
+    Returns a function `quantize(arr, scale, zero_point)` equivalent to
+    `quantize_nparray(qType, arr, scale, zero_point, low, high)`. The output type and the clipping
+    range are resolved once, which avoids doing it again for every channel when a tensor is
+    quantized slice by slice with the same type.
+    :param qType: data type to quantize to
+    :parameter low: lower bound for the quantized values, clipped to the range of qType. Defaults to None.
+    :parameter high: upper bound for the quantized values, clipped to the range of qType. Defaults to None.
+    :return: quantization function
+    """
     assert (
         qType in ONNX_TYPE_TO_NP_TYPE
     ), f"Unexpected data type {qType} requested. Only INT8, UINT8, INT16, and UINT16 are supported."
@@ -196,46 +343,47 @@ def quantize_nparray(qType, arr, scale, zero_point, low=None, high=None):
         onnx_proto.TensorProto.FLOAT8E5M2,
         onnx_proto.TensorProto.FLOAT8E5M2FNUZ,
     ):
-        if zero_point != 0:
-            raise NotImplementedError(f"zero_point is expected to be null for float 8 not {zero_point!r}.")
-        if arr.dtype == numpy.float32:
-            onnx_type = TensorProto.FLOAT
-        elif arr.dtype == numpy.float16:
-            onnx_type = TensorProto.FLOAT16
-        else:
-            raise ValueError(f"Unexpected dtype {arr.dtype}.")
-        onnx_model = make_model(
-            make_graph(
-                [
-                    make_node(
-                        "Constant", [], ["zero_point"], value=onnx.helper.make_tensor("zero_point", qType, [], [0])
-                    ),
-                    make_node("QuantizeLinear", ["X", "scale", "zero_point"], ["Y"]),
-                ],
-                "qu",
-                [
-                    make_tensor_value_info("X", onnx_type, None),
-                    make_tensor_value_info("scale", onnx_type, None),
-                ],
-                [make_tensor_value_info("Y", qType, None)],
-            )
-        )
-        ref = ReferenceEvaluator(onnx_model)
-        return _check_type(ref.run(None, {"X": arr, "scale": scale})[0])
-    else:
-        # Quantizes data for all integer types.
-        #
-        # For int4 types, the quantized data is returned as either np.int8 or np.uint8,
-        # which matches the python reference ONNX implementation of QuantizeLinear.
-        # This data can be packed into 4-bit elements by using pack_bytes_to_4bit().
-        dtype = ONNX_TYPE_TO_NP_TYPE[qType]
-        (qmin, qmax) = get_qmin_qmax_for_qType(qType, reduce_range=False, symmetric=True)
-
-        cliplow = max(qmin, low) if low is not None else qmin
-        cliphigh = min(qmax, high) if high is not None else qmax
-        arr_fp32 = numpy.asarray((arr.astype(numpy.float32) / scale).round() + zero_point)
+
+        def quantize_float8(arr, scale, zero_point):
+            if zero_point != 0:
+                raise NotImplementedError(f"zero_point is expected to be null for float 8 not {zero_point!r}.")
+            if arr.dtype not in (numpy.float32, numpy.float16):
+                raise ValueError(f"Unexpected dtype {arr.dtype}.")
+            return _check_type(_to_float8e4m3(arr / scale).view(float8e4m3fn))
+
+        return quantize_float8
+
+    # Quantizes data for all integer types.
+    #
+    # For int4 types, the quantized data is returned as either np.int8 or np.uint8,
+    # which matches the python reference ONNX implementation of QuantizeLinear.
+    # This data can be packed into 4-bit elements by using pack_bytes_to_4bit().
+    dtype = ONNX_TYPE_TO_NP_TYPE[qType]
+    (qmin, qmax) = get_qmin_qmax_for_qType(qType, reduce_range=False, symmetric=True)
+
+    cliplow = max(qmin, low) if low is not None else qmin
+    cliphigh = min(qmax, high) if high is not None else qmax
+    kernel = _get_quantize_kernel() if qType in _NUMBA_QUANT_TYPES else None
+
+    def quantize(arr, scale, zero_point):
+        # The kernel only handles one scale and zero point, per-channel data uses numpy.
+        if kernel and arr.size >= _NUMBA_MIN_SIZE and numpy.ndim(scale) == 0 and numpy.ndim(zero_point) == 0:
+            return _check_type(_quantize_nparray_numba(kernel, arr, scale, zero_point, cliplow, cliphigh, dtype))
+
+        # All the arithmetic is done in a single float32 buffer to avoid allocating
+        # a full-size temporary for each intermediate result on large weights.
+        arr_fp32 = numpy.empty(arr.shape, dtype=numpy.float32)
+        numpy.divide(arr, scale, out=arr_fp32, dtype=numpy.float32)
+        numpy.rint(arr_fp32, out=arr_fp32)
+        numpy.add(arr_fp32, zero_point, out=arr_fp32)
         numpy.clip(arr_fp32, cliplow, cliphigh, out=arr_fp32)
-        return _check_type(arr_fp32.astype(dtype))
+        return _check_type(arr_fp32.astype(dtype, copy=False))
+
+    return quantize
+
+
+def quantize_nparray(qType, arr, scale, zero_point, low=None, high=None):
+    return build_quantizer(qType, low, high)(arr, scale, zero_point)
 
 
 def compute_scale_zp(rmin, rmax, qmin, qmax, symmetric=False, min_real_range=None):
@@ -249,9 +397,10 @@ def compute_scale_zp(rmin, rmax, qmin, qmax, symmetric=False, min_real_range=Non
     [rmin,rmax] is symmetrized to [-absmax, +absmax], where
     absmax = max(abs(rmin), abs(rmax)).
 
-    :parameter rmin: minimum value of r
-    :parameter rmax: maximum value of r
-    :parameter qmin: minimum value representable by the target quantization data type
+    :parameter rmin: minimum value of r (numpy scalar or single element array)
+    :parameter rmax: maximum value of r (numpy scalar or single element array), its dtype is the dtype of the scale
+    :parameter qmin: minimum value representable by the target quantization data type, its dtype is the dtype
+        of the zero point
     :parameter qmax: maximum value representable by the target quantization data type
     :parameter symmetric: True if the floating-point range should be made symmetric. Defaults to False.
     :parameter min_real_range: Minimum floating-point range (i.e., rmax - rmin) to enforce. Defaults to None.
@@ -261,29 +410,37 @@ def compute_scale_zp(rmin, rmax, qmin, qmax, symmetric=False, min_real_range=Non
     if qmin > 0 or qmax < 0:
         raise ValueError(f"qmin and qmax must meet requirement: qmin <= 0 <= qmax while qmin:{qmin}, qmmax:{qmax}")
 
+    # The computation is done with python floats (rmin and rmax are scalars) and only the
+    # results are converted to the data types of rmax and qmin.
+    scale_dtype = rmax.dtype
+    zero_point_dtype = qmin.dtype
+
     # Adjust rmin and rmax such that 0 is included in the range. This is
     # required to make sure zero can be represented by the quantization data
     # type (i.e. to make sure qmin <= zero_point <= qmax)
-    rmin = numpy.minimum(rmin, numpy.array(0, dtype=rmin.dtype))
-    rmax = numpy.maximum(rmax, numpy.array(0, dtype=rmax.dtype))
+    rmin = min(rmin.item(), 0.0)
+    rmax = max(rmax.item(), 0.0)
 
-    # Ensure a minimum float-point range if specified.
-    if min_real_range is not None:
-        rmax = max(rmax, rmin + min_real_range)
+    # Ensure a minimum float-point range if specified. The range is computed in the
+    # input type, or in double precision when it is widened here.
+    range_type = scale_dtype.type
+    if min_real_range is not None and rmin + min_real_range > rmax:
+        rmax = rmin + min_real_range
+        range_type = float
 
     if symmetric:
-        absmax = numpy.maximum(numpy.abs(rmin), numpy.abs(rmax))
+        absmax = max(abs(rmin), abs(rmax))
         rmin = -absmax
         rmax = +absmax
 
     assert qmin <= qmax, f"qmin={rmin} > qmax={rmax}"
-    dr = numpy.array(rmax - rmin, dtype=numpy.float64)
-    dq = numpy.array(qmax, dtype=numpy.float64) - numpy.array(qmin, dtype=numpy.float64)
-    scale = numpy.array(dr / dq)
+    qmin = float(qmin)
+    qmax = float(qmax)
+    scale = float(range_type(rmax) - range_type(rmin)) / (qmax - qmin)
     assert scale >= 0, "scale isse"
-    if scale < numpy.finfo(rmax.dtype).tiny:
-        scale = numpy.array(1.0, dtype=rmax.dtype)
-        zero_point = numpy.array(0, dtype=qmin.dtype)
+    if scale < numpy.finfo(scale_dtype).tiny:
+        scale = numpy.array(1.0, dtype=scale_dtype)
+        zero_point = numpy.array(0, dtype=zero_point_dtype)
     else:
         if symmetric:
             # When symmetric (i.e., rmax == -rmin), the zero_point formula reduces to round((qmax + qmin) / 2.0).
@@ -291,12 +448,10 @@ def compute_scale_zp(rmin, rmax, qmin, qmax, symmetric=False, min_real_range=Non
             # for int8, uint8, int16, and uint16 are always 0, 128, 0, and 32768, respectively.
             # This is important for per-channel/symmetric QLinearConv on CPU EP, which requires all channels to have
             # the exact same zero_point values.
-            zero_point = numpy.array(
-                numpy.round((qmin + qmax) / numpy.array(2.0, dtype=numpy.float64)), dtype=qmin.dtype
-            )
+            zero_point = numpy.array(round((qmin + qmax) / 2.0), dtype=zero_point_dtype)
         else:
-            zero_point = numpy.array(numpy.round(qmin - rmin / scale), dtype=qmin.dtype)
-        scale = scale.astype(rmax.dtype)
+            zero_point = numpy.array(round(qmin - rmin / scale), dtype=zero_point_dtype)
+        scale = numpy.array(scale, dtype=scale_dtype)
 
     return [zero_point, scale]
 
@@ -325,6 +480,7 @@ def compute_scale_zp_float8(element_type, std):
         else:
             raise ValueError(f"Quantization to element_type={element_type} not implemented.")
         FLOAT8_DISTRIBUTIONS[element_type] = values
+        FLOAT8_STDS[element_type] = numpy.std(values)
     elif element_type == TensorProto.FLOAT8E4M3FN:
         from onnx.reference.custom_element_types import float8e4m3fn
 
@@ -332,7 +488,7 @@ def compute_scale_zp_float8(element_type, std):
 
     if zp_dtype is None:
         raise TypeError(f"Unexpected element_type {element_type}.")
-    std_f8 = numpy.std(FLOAT8_DISTRIBUTIONS[element_type])
+    std_f8 = FLOAT8_STDS[element_type]
     zero = numpy.array(0, dtype=zp_dtype)
     scale = numpy.array(std / std_f8, dtype=std.dtype)
     return [zero, scale]
@@ -368,15 +524,18 @@ def quantize_data(
     """
     if not isinstance(data, numpy.ndarray):
         raise TypeError(f"Weight must be given as an array not {type(data)}.")
-    if rmin_override is not None:
-        rmin = rmin_override
+    if rmin_override is None and rmax_override is None:
+        rmin, rmax = _min_max(data)
     else:
-        rmin = data.min() if len(data) else 0.0
+        if rmin_override is not None:
+            rmin = rmin_override
+        else:
+            rmin = data.min() if data.size else 0.0
 
-    if rmax_override is not None:
-        rmax = rmax_override
-    else:
-        rmax = data.max() if len(data) else 0.0
+        if rmax_override is not None:
+            rmax = rmax_override
+        else:
+            rmax = data.max() if data.size else 0.0
 
     rmin = numpy.array(rmin, dtype=data.dtype)
     rmax = numpy.array(rmax, dtype=data.dtype)
@@ -389,7 +548,7 @@ def quantize_data(
         std = numpy.std(data)
         zero_point, scale = compute_scale_zp_float8(qType, std)
         quantized_data = quantize_nparray(qType, data, scale, zero_point)
-        if any((quantized_data.astype(numpy.uint8).ravel() & 127) == 127):
+        if quantized_data.size and (quantized_data.view(numpy.uint8) & 127).max() == 127:
             np_data = numpy.asarray(data)
             raise RuntimeError(
                 f"One of the quantized value is NaN data in [{np_data.min()}, {np_data.max()}], "
@@ -405,7 +564,7 @@ def quantize_data(
         TensorProto.INT4,
         TensorProto.UINT4,
     ):
-        if len(data):
+        if data.size:
             qmin, qmax = get_qmin_qmax_for_qType(qType, reduce_range, symmetric=symmetric)
             zero_point, scale = compute_scale_zp(rmin, rmax, qmin, qmax, symmetric, min_real_range)
         quantized_data = quantize_nparray(qType, data, scale, zero_point)
@@ -414,6 +573,61 @@ def quantize_data(
     raise ValueError(f"Unexpected value for qType={qType}.")
 
 
+def quantize_data_per_channel(data, axis, qType, symmetric, reduce_range=False, min_real_range=None):
+    """
+    Quantizes data with one scale and zero point per channel along the given axis. The result is the same
+    as calling quantize_data on every slice `data.take(i, axis)` but the ranges of all channels are computed
+    with one minimum and one maximum reduction, and the data is quantized with a single call.
+    :param data: data to quantize
+    :param axis: channel axis
+    :param qType: data type to quantize to. Supported types are INT8, UINT8, INT16, UINT16, INT4 and UINT4.
+    :param symmetric: whether symmetric quantization is used or not.
+    :parameter reduce_range: True if the quantization range should be reduced. Defaults to False.
+    :parameter min_real_range: Minimum floating-point range (i.e., rmax - rmin) to enforce. Defaults to None.
+    :return: minimums, maximums, zero points and scales (1D arrays with one value per channel),
+        and quantized data with the same shape as data
+    """
+    if not isinstance(data, numpy.ndarray):
+        raise TypeError(f"Weight must be given as an array not {type(data)}.")
+    if qType not in (
+        TensorProto.INT8,
+        TensorProto.UINT8,
+        TensorProto.INT16,
+        TensorProto.UINT16,
+        TensorProto.INT4,
+        TensorProto.UINT4,
+    ):
+        raise ValueError(f"Unexpected value for qType={qType}.")
+    is_valid, axis_norm = normalize_axis(axis, data.ndim)
+    if not is_valid:
+        raise ValueError(f"Axis {axis} is out-of-bounds for rank {data.ndim}.")
+    axis = axis_norm
+
+    channel_count = data.shape[axis]
+    if data.size:
+        reduce_axes = tuple(i for i in range(data.ndim) if i != axis)
+        rmins = data.min(axis=reduce_axes)
+        rmaxs = data.max(axis=reduce_axes)
+    else:
+        rmins = numpy.zeros(channel_count, dtype=data.dtype)
+        rmaxs = numpy.zeros(channel_count, dtype=data.dtype)
+
+    qmin, qmax = get_qmin_qmax_for_qType(qType, reduce_range, symmetric=symmetric)
+    zero_points = numpy.zeros(channel_count, dtype=qmin.dtype)
+    scales = numpy.ones(channel_count, dtype=data.dtype)
+    if data.size:
+        for i in range(channel_count):
+            zero_points[i], scales[i] = compute_scale_zp(rmins[i], rmaxs[i], qmin, qmax, symmetric, min_real_range)
+
+    # Scales and zero points are broadcast along the channel axis.
+    broadcast_shape = [1] * data.ndim
+    broadcast_shape[axis] = channel_count
+    quantized_data = quantize_nparray(
+        qType, data, scales.reshape(broadcast_shape), zero_points.reshape(broadcast_shape)
+    )
+    return _check_type(rmins, rmaxs, zero_points, scales, quantized_data, zero_point_index=2)
+
+
 def get_qmin_qmax_for_qType(qType, reduce_range=False, symmetric=False):  # noqa: N802
     """
     Return qmin and qmax, the minimum and maximum value representable by the given qType
@@ -423,26 +637,10 @@ def get_qmin_qmax_for_qType(qType, reduce_range=False, symmetric=False):  # noqa
     if qType == onnx_proto.TensorProto.FLOAT8E4M3FN:
         raise NotImplementedError("This function is not implemented for float 8 as not needed.")
 
-    qrange = None
-
-    if reduce_range:
-        qrange = ONNX_INT_TYPE_REDUCED_RANGE.get(qType)
-    elif symmetric and qType in ONNX_INT_TYPE_SYMMETRIC_RANGE:
-        qrange = ONNX_INT_TYPE_SYMMETRIC_RANGE[qType]
-    else:
-        qrange = ONNX_INT_TYPE_RANGE.get(qType)
-
-    if not qrange:
+    qrange = _QMIN_QMAX_TABLE.get((qType, bool(reduce_range), bool(symmetric)))
+    if qrange is None:
         raise ValueError(f"Unexpected data type {qType} requested. Only INT8, UINT8, INT16, and UINT16 are supported.")
 
-    qmin, qmax = qrange
-    if qmin > 0 or qmax < 0:
-        raise ValueError(
-            f"qmin and qmax must meet requirement: qmin <= 0 <= qmax while "
-            f"qmin:{qmin}, qmmax:{qmax}, dtype={qmin.dtype}, reduce_range={reduce_range}, "
-            f"symmetric={symmetric}, qType={qType}"
-        )
-
     return qrange
 
 
@@ -568,6 +766,11 @@ class BiasToQuantize:
         self.weight_name = weight_name
 
 
+# Name of the AttributeProto field holding the value for each attribute type, based on the
+# attribute type definitions from AttributeProto in https://github.com/onnx/onnx/blob/main/onnx/onnx.proto
+_ATTR_FIELD = (None, "f", "i", "s", "t", "g", "floats", "ints", "strings", "tensors", "graphs")
+
+
 def attribute_to_kwarg(attribute):
     """
     Convert attribute to kwarg format for use with onnx.helper.make_node.
@@ -576,55 +779,46 @@ def attribute_to_kwarg(attribute):
     """
     if attribute.type == 0:
         raise ValueError(f"attribute {attribute.name} does not have type specified.")
-
-    # Based on attribute type definitions from AttributeProto
-    # definition in https://github.com/onnx/onnx/blob/main/onnx/onnx.proto
-    if attribute.type == 1:
-        value = attribute.f
-    elif attribute.type == 2:
-        value = attribute.i
-    elif attribute.type == 3:
-        value = attribute.s
-    elif attribute.type == 4:
-        value = attribute.t
-    elif attribute.type == 5:
-        value = attribute.g
-    elif attribute.type == 6:
-        value = attribute.floats
-    elif attribute.type == 7:
-        value = attribute.ints
-    elif attribute.type == 8:
-        value = attribute.strings
-    elif attribute.type == 9:
-        value = attribute.tensors
-    elif attribute.type == 10:
-        value = attribute.graphs
-    else:
+    if attribute.type >= len(_ATTR_FIELD):
         raise ValueError(f"attribute {attribute.name} has unsupported type {attribute.type}.")
 
-    return {attribute.name: value}
+    return {attribute.name: getattr(attribute, _ATTR_FIELD[attribute.type])}
+
+
+def build_name_index(item_list):
+    """
+    Helper function to index items by name, to be given to find_by_name when many items are looked up
+    in the same list. The first item is kept if several items have the same name.
+        parameter item_list: list of items.
+        return: dictionary {name: item}.
+    """
+    index = {}
+    for item in item_list:
+        index.setdefault(item.name, item)
+    return index
 
 
 def find_by_name(item_name, item_list):
     """
     Helper function to find item by name in a list.
         parameter item_name: name of the item.
-        parameter item_list: list of items.
-        return: item if found. None otherwise.
+        parameter item_list: list of items, or dictionary returned by build_name_index.
+        return: first item with this name if found. None otherwise.
     """
-    items = [item for item in item_list if item.name == item_name]
-    return items[0] if len(items) > 0 else None
+    if isinstance(item_list, dict):
+        return item_list.get(item_name)
+    return next((item for item in item_list if item.name == item_name), None)
 
 
 def get_elem_index(elem_name, elem_list):
     """
-    Helper function to return index of an item in a node list
+    Helper function to return index of an item in a node list, -1 if not found.
+    If the item appears several times, the index of the last occurrence is returned.
     """
-    elem_idx = -1
-    for i in range(len(elem_list)):
+    for i in range(len(elem_list) - 1, -1, -1):
         if elem_list[i] == elem_name:
-            elem_idx = i
-    return elem_idx
+            return i
+    return -1
 
 
 def get_mul_node(inputs, output, name):
@@ -668,12 +862,8 @@ def write_calibration_table(calibration_cache, dir="."):
     Helper function to write calibration table to files.
     """
 
-    import json
-
-    import flatbuffers
-
-    import onnxruntime.quantization.CalTableFlatBuffers.KeyValue as KeyValue
-    import onnxruntime.quantization.CalTableFlatBuffers.TrtTable as TrtTable
+    if flatbuffers is None:
+        raise ImportError("flatbuffers is required to write the calibration table.")
 
     logging.info(f"calibration cache: {calibration_cache}")
 
@@ -737,9 +927,8 @@ def smooth_distribution(p, eps=0.0001):
     Ref: http://web.engr.illinois.edu/~hanj/cs412/bk3/KL-divergence.pdf
          https://github.com//apache/incubator-mxnet/blob/master/python/mxnet/contrib/quantization.py
     """
-    is_zeros = (p == 0).astype(numpy.float32)
-    is_nonzeros = (p != 0).astype(numpy.float32)
-    n_zeros = is_zeros.sum()
+    is_zeros = p == 0
+    n_zeros = int(is_zeros.sum())
     n_nonzeros = p.size - n_zeros
 
     if not n_nonzeros:
@@ -753,13 +942,80 @@ def smooth_distribution(p, eps=0.0001):
     )
 
     hist = p.astype(numpy.float32)
-    hist += eps * is_zeros + (-eps1) * is_nonzeros
+    hist -= eps1
+    hist[is_zeros] = eps
     assert (hist <= 0).sum() == 0
 
     return hist
 
 
+def _read_varint(buffer, pos: int) -> tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _iter_proto_fields(buffer, start: int, end: int):
+    """
+    Iterates over the fields of a serialized protobuf message stored in buffer[start:end] without parsing it.
+    Yields (field_number, wire_type, value) where value is the integer for varints, the (start, end) offsets
+    of the content for length-delimited fields and None for fixed-size fields.
+    """
+    pos = start
+    while pos < end:
+        key, pos = _read_varint(buffer, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(buffer, pos)
+        elif wire_type == 1:
+            value = None
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(buffer, pos)
+            value = (pos, pos + length)
+            pos += length
+        elif wire_type == 5:
+            value = None
+            pos += 4
+        else:
+            raise ValueError(f"Unexpected wire type {wire_type} for field {field_number}.")
+        yield field_number, wire_type, value
+    if pos != end:
+        raise ValueError("Truncated protobuf message.")
+
+
+def _serialized_model_has_external_data(buffer) -> bool:
+    for model_field, model_wire_type, graph in _iter_proto_fields(buffer, 0, len(buffer)):
+        if model_field != ModelProto.GRAPH_FIELD_NUMBER or model_wire_type != 2:
+            continue
+        for graph_field, graph_wire_type, initializer in _iter_proto_fields(buffer, *graph):
+            if graph_field != onnx_proto.GraphProto.INITIALIZER_FIELD_NUMBER or graph_wire_type != 2:
+                continue
+            data_location = None
+            for tensor_field, tensor_wire_type, value in _iter_proto_fields(buffer, *initializer):
+                if tensor_field == TensorProto.DATA_LOCATION_FIELD_NUMBER and tensor_wire_type == 0:
+                    data_location = value
+            if data_location == TensorProto.EXTERNAL:
+                return True
+    return False
+
+
 def model_has_external_data(model_path: Path):
+    # The initializers of the main graph are scanned directly in the memory-mapped model so that
+    # the tensor data embedded in the model is neither parsed nor copied.
+    try:
+        with open(model_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return _serialized_model_has_external_data(buffer)
+    except (ValueError, IndexError):
+        # Empty or malformed file, onnx.load reports the error if there is one.
+        pass
+
     model = onnx.load(model_path.as_posix(), load_external_data=False)
     for intializer in model.graph.initializer:
         if external_data_helper.uses_external_data(intializer):
@@ -817,12 +1073,21 @@ def model_has_infer_metadata(model: ModelProto) -> bool:
     return False
 
 
+# Largest model file for which load_model_with_shape_infer runs shape inference in memory.
+# The in-memory path holds several serialized copies of the model at once.
+_IN_MEMORY_SHAPE_INFERENCE_MAX_SIZE = 128 * 1024 * 1024
+
+
 def load_model_with_shape_infer(model_path: Path) -> ModelProto:
-    inferred_model_path = generate_identified_filename(model_path, "-inferred")
-    onnx.shape_inference.infer_shapes_path(str(model_path), str(inferred_model_path))
-    model = onnx.load(inferred_model_path.as_posix())
+    if os.path.getsize(model_path) < _IN_MEMORY_SHAPE_INFERENCE_MAX_SIZE and not model_has_external_data(model_path):
+        # Small model stored in a single file, no need to write and reload an intermediate model.
+        model = onnx.shape_inference.infer_shapes(onnx.load(model_path.as_posix()))
+    else:
+        inferred_model_path = generate_identified_filename(model_path, "-inferred")
+        onnx.shape_inference.infer_shapes_path(str(model_path), str(inferred_model_path))
+        model = onnx.load(inferred_model_path.as_posix())
+        inferred_model_path.unlink()
     add_infer_metadata(model)
-    inferred_model_path.unlink()
     return model
 
 
@@ -833,8 +1098,22 @@ def save_and_reload_model_with_shape_infer(model: ModelProto) -> ModelProto:
         return load_model_with_shape_infer(model_path)
 
 
+_FLOAT_TENSOR_TYPE_TO_NP_TYPE = {
+    onnx_proto.TensorProto.FLOAT: numpy.dtype("float32"),
+    onnx_proto.TensorProto.FLOAT16: numpy.dtype("float16"),
+}
+
+
 def tensor_proto_to_array(initializer: TensorProto) -> numpy.ndarray:
-    if initializer.data_type in (onnx_proto.TensorProto.FLOAT, onnx_proto.TensorProto.FLOAT16):
+    dtype = _FLOAT_TENSOR_TYPE_TO_NP_TYPE.get(initializer.data_type)
+    if dtype is not None:
+        if (
+            sys.byteorder == "little"
+            and initializer.HasField("raw_data")
+            and initializer.data_location != onnx_proto.TensorProto.EXTERNAL
+        ):
+            # Read-only view on the serialized bytes, the weights are not copied.
+            return numpy.frombuffer(initializer.raw_data, dtype=dtype).reshape(initializer.dims)
         return onnx.numpy_helper.to_array(initializer)
 
     raise ValueError(
@@ -5,20 +5,28 @@
 # license information.
 # --------------------------------------------------------------------------
 
+import importlib.util
+import os
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import numpy
 import onnx
 from onnx import TensorProto, helper, numpy_helper
 
+from onnxruntime.quantization import quant_utils
 from onnxruntime.quantization.quant_utils import (
+    build_quantizer,
     compute_scale_zp,
     load_model_with_shape_infer,
+    model_has_external_data,
     model_has_infer_metadata,
     pack_bytes_to_4bit,
     quantize_data,
+    quantize_data_per_channel,
+    quantize_nparray,
 )
 
 
@@ -80,6 +88,29 @@ class TestQuantUtil(unittest.TestCase):
             [0, 0.0002 / 65535],
         )
 
+        # Test that the range rmax - rmin is computed in the input type.
+        zp, scale = compute_scale_zp(
+            numpy.array(-0.257, dtype=numpy.float32),
+            numpy.array(0.71, dtype=numpy.float32),
+            numpy.array(0, dtype=numpy.uint16),
+            numpy.array(65535, dtype=numpy.uint16),
+        )
+        self.assertEqual(zp.dtype, numpy.uint16)
+        self.assertEqual(zp, 17417)
+        self.assertEqual(scale.dtype, numpy.float32)
+        self.assertEqual(scale, numpy.float32((numpy.float32(0.71) - numpy.float32(-0.257)) / 65535))
+
+        zp, scale = compute_scale_zp(
+            numpy.array(-4.9296875, dtype=numpy.float16),
+            numpy.array(0.77001953125, dtype=numpy.float16),
+            numpy.array(-32768, dtype=numpy.int16),
+            numpy.array(32767, dtype=numpy.int16),
+        )
+        self.assertEqual(zp.dtype, numpy.int16)
+        self.assertEqual(zp, 23918)
+        self.assertEqual(scale.dtype, numpy.float16)
+        self.assertEqual(scale, numpy.float16(8.696e-05))
+
     def test_load_external_model(self):
         input_name = "input"
         output_name = "output"
@@ -111,6 +142,53 @@ class TestQuantUtil(unittest.TestCase):
             model_reloaded = load_model_with_shape_infer(Path(model_file_path))
             self.assertTrue(model_has_infer_metadata(model_reloaded))
 
+    def test_load_model_with_shape_infer(self):
+        add_node = helper.make_node("Add", ["input", "weight"], ["add_output"], name="add_node")
+        relu_node = helper.make_node("Relu", ["add_output"], ["output"], name="relu_node")
+        graph = helper.make_graph(
+            [add_node, relu_node],
+            "test_load_model_with_shape_infer",
+            [helper.make_tensor_value_info("input", TensorProto.FLOAT, [4, 8])],
+            [helper.make_tensor_value_info("output", TensorProto.FLOAT, [4, 8])],
+            initializer=[numpy_helper.from_array(numpy.ones([4, 8], dtype=numpy.float32), name="weight")],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_file_path = Path(temp_dir) / "model.onnx"
+            onnx.save(model, model_file_path.as_posix())
+            # Shape inference in memory, then through an intermediate file.
+            model_in_memory = load_model_with_shape_infer(model_file_path)
+            with mock.patch.object(quant_utils, "_IN_MEMORY_SHAPE_INFERENCE_MAX_SIZE", 0):
+                model_from_file = load_model_with_shape_infer(model_file_path)
+            self.assertEqual(sorted(Path(temp_dir).iterdir()), [model_file_path])
+
+        for model_reloaded in (model_in_memory, model_from_file):
+            self.assertTrue(model_has_infer_metadata(model_reloaded))
+            self.assertEqual([v.name for v in model_reloaded.graph.value_info], ["add_output"])
+        self.assertEqual(model_in_memory.SerializeToString(), model_from_file.SerializeToString())
+
+    def test_model_has_external_data(self):
+        weight_data = numpy.random.default_rng(8).normal(0, 0.1, [64, 64]).astype(numpy.float32)
+        add_node = helper.make_node("Add", ["input", "weight"], ["output"], name="add_node")
+        graph = helper.make_graph(
+            [add_node],
+            "test_model_has_external_data",
+            [helper.make_tensor_value_info("input", TensorProto.FLOAT, [64, 64])],
+            [helper.make_tensor_value_info("output", TensorProto.FLOAT, [64, 64])],
+            initializer=[numpy_helper.from_array(weight_data, name="weight")],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            model_file_path = Path(temp_dir) / "model.onnx"
+            onnx.save(model, model_file_path.as_posix())
+            self.assertFalse(model_has_external_data(model_file_path))
+
+            model_ext_file_path = Path(temp_dir) / "model_ext.onnx"
+            onnx.save(model, model_ext_file_path.as_posix(), save_as_external_data=True, size_threshold=0)
+            self.assertTrue(model_has_external_data(model_ext_file_path))
+
     def test_pack_bytes_to_4bit(self):
         """
         Tests the pack_bytes_to_4bit() utility.
@@ -172,6 +250,144 @@ class TestQuantUtil(unittest.TestCase):
 
                     self.assertEqual(numpy.array(actual_quant_val), expected_quant_val)
 
+    def test_quantize_data_size(self):
+        """
+        Test that quantize_data handles scalar weights and weights without elements.
+        """
+        rmin, rmax, _, scale, data_quant = quantize_data(
+            numpy.array(1.5, dtype=numpy.float32), TensorProto.UINT8, False
+        )
+        self.assertEqual(rmin, 1.5)
+        self.assertEqual(rmax, 1.5)
+        self.assertEqual(data_quant.shape, ())
+        self.assertEqual(data_quant, numpy.round(1.5 / scale))
+
+        rmin, rmax, _, scale, data_quant = quantize_data(
+            numpy.zeros((3, 0), dtype=numpy.float32), TensorProto.INT8, True
+        )
+        self.assertEqual(rmin, 0)
+        self.assertEqual(rmax, 0)
+        self.assertEqual(scale, 1)
+        self.assertEqual(data_quant.shape, (3, 0))
+        self.assertEqual(data_quant.dtype, numpy.int8)
+
+    def test_quantize_data_min_max_blocks(self):
+        """
+        Test that the range of a weight larger than one block is the same as its minimum and maximum.
+        """
+        data_float = numpy.random.default_rng(20).normal(0, 2, [10, 103]).astype(numpy.float32)
+        data_float[7, 5] = -9.5
+        data_float[2, 99] = 8.25
+        with mock.patch.object(quant_utils, "_MIN_MAX_BLOCK_SIZE", 64):
+            rmin, rmax, _, _, _ = quantize_data(data_float, TensorProto.UINT8, False)
+            self.assertEqual(rmin, numpy.float32(-9.5))
+            self.assertEqual(rmax, numpy.float32(8.25))
+            self.assertEqual(rmin.dtype, numpy.float32)
+            self.assertEqual(rmax.dtype, numpy.float32)
+
+            # Strided data and NaN values are reduced like numpy.min and numpy.max do.
+            data_strided = data_float[:, ::2]
+            self.assertEqual(quant_utils._min_max(data_strided), (data_strided.min(), data_strided.max()))
+            data_float[9, 100] = numpy.nan
+            rmin, rmax = quant_utils._min_max(data_float)
+            self.assertTrue(numpy.isnan(rmin))
+            self.assertTrue(numpy.isnan(rmax))
+
+    def test_quantize_data_per_channel(self):
+        """
+        Test that quantize_data_per_channel returns the same results as calling quantize_data on each channel.
+        """
+        data_float = numpy.random.default_rng(7).normal(0, 2.0, (5, 3, 4, 2)).astype(numpy.float32)
+        data_float[1] = 0.0  # channel with an empty range
+
+        subtest_configs = [
+            (onnx.TensorProto.INT8, True, 0),
+            (onnx.TensorProto.UINT8, False, 0),
+            (onnx.TensorProto.INT16, True, 2),
+            (onnx.TensorProto.UINT16, False, -1),
+            (onnx.TensorProto.INT4, True, 1),
+            (onnx.TensorProto.UINT4, False, 0),
+        ]
+
+        for onnx_type, symmetric, axis in subtest_configs:
+            with self.subTest(onnx_type=onnx_type, symmetric=symmetric, axis=axis):
+                rmins, rmaxs, zero_points, scales, data_quant = quantize_data_per_channel(
+                    data_float, axis, onnx_type, symmetric
+                )
+                self.assertEqual(data_quant.shape, data_float.shape)
+
+                for i in range(data_float.shape[axis]):
+                    rmin, rmax, zero_point, scale, channel_quant = quantize_data(
+                        data_float.take(i, axis).flatten(), onnx_type, symmetric
+                    )
+                    self.assertEqual(rmins[i], rmin)
+                    self.assertEqual(rmaxs[i], rmax)
+                    self.assertEqual(zero_points[i], zero_point)
+                    self.assertEqual(scales[i], scale)
+                    self.assertEqual(data_quant.take(i, axis).flatten().tolist(), channel_quant.tolist())
+
+    def test_build_quantizer(self):
+        """
+        Test that the function returned by build_quantizer rounds, shifts and clips the scaled data.
+        """
+        data_float = numpy.random.default_rng(22).normal(0, 2, [4, 25]).astype(numpy.float32)
+        subtest_configs = [
+            (onnx.TensorProto.INT8, numpy.int8, -127, 127, None, None),
+            (onnx.TensorProto.UINT8, numpy.uint8, 0, 255, None, None),
+            (onnx.TensorProto.INT16, numpy.int16, -32767, 32767, None, None),
+            (onnx.TensorProto.INT4, numpy.int8, -8, 7, None, None),
+            (onnx.TensorProto.UINT4, numpy.uint8, 0, 15, None, None),
+            (onnx.TensorProto.UINT8, numpy.uint8, 10, 200, 10, 200),
+        ]
+        for onnx_type, np_type, qmin, qmax, low, high in subtest_configs:
+            with self.subTest(onnx_type=onnx_type, low=low, high=high):
+                quantize = build_quantizer(onnx_type, low, high)
+                for i in range(data_float.shape[0]):
+                    scale = numpy.array(0.01 * (i + 1), dtype=numpy.float32)
+                    zero_point = numpy.array(i, dtype=np_type)
+                    actual = quantize(data_float[i], scale, zero_point)
+                    expected = numpy.clip(numpy.rint(data_float[i] / scale) + i, qmin, qmax).astype(np_type)
+                    self.assertEqual(actual.dtype, np_type)
+                    self.assertEqual(actual.tolist(), expected.tolist())
+
+        # Float 8 values are converted with saturation, 448 is the largest finite value.
+        data_float = numpy.array([0.0, 2.0, 1.0, -4.0, 896.0, 2000.0, -0.03125, 6.2])
+        expected = [0x00, 0x38, 0x30, 0xC0, 0x7E, 0x7E, 0x88, 0x44]
+        quantize = build_quantizer(onnx.TensorProto.FLOAT8E4M3FN)
+        for np_type in (numpy.float32, numpy.float16):
+            with self.subTest(onnx_type=onnx.TensorProto.FLOAT8E4M3FN, dtype=np_type):
+                actual = quantize(data_float.astype(np_type), numpy.array(2.0, dtype=np_type), 0)
+                self.assertEqual(actual.shape, data_float.shape)
+                self.assertEqual(actual.view(numpy.uint8).tolist(), expected)
+        with self.assertRaises(NotImplementedError):
+            quantize(data_float.astype(numpy.float32), numpy.array(2.0, dtype=numpy.float32), 1)
+
+    @unittest.skipUnless(importlib.util.find_spec("numba"), "numba is not installed")
+    def test_quantize_nparray_numba(self):
+        """
+        Test that the optional numba kernel gives the same results as the numpy implementation.
+        """
+        data_float = numpy.random.default_rng(2).normal(0, 2, [quant_utils._NUMBA_MIN_SIZE + 7]).astype(numpy.float32)
+        data_float[:4] = [0.5, -0.5, 1e6, -1e6]
+        scale = numpy.array(0.013, dtype=numpy.float32)
+        subtest_configs = [
+            (onnx.TensorProto.INT8, numpy.int8, 3),
+            (onnx.TensorProto.UINT8, numpy.uint8, 128),
+            (onnx.TensorProto.INT16, numpy.int16, -5),
+            (onnx.TensorProto.UINT16, numpy.uint16, 32768),
+        ]
+        for onnx_type, np_type, zp in subtest_configs:
+            with self.subTest(onnx_type=onnx_type):
+                zero_point = numpy.array(zp, dtype=np_type)
+                with mock.patch.dict(os.environ, {"ORT_QUANTIZATION_USE_NUMBA": "0"}):
+                    self.assertIsNone(quant_utils._get_quantize_kernel())
+                    expected = quantize_nparray(onnx_type, data_float, scale, zero_point)
+                with mock.patch.dict(os.environ, {"ORT_QUANTIZATION_USE_NUMBA": "1"}):
+                    self.assertIsNotNone(quant_utils._get_quantize_kernel())
+                    actual = quantize_nparray(onnx_type, data_float, scale, zero_point)
+                self.assertEqual(actual.dtype, expected.dtype)
+                numpy.testing.assert_array_equal(actual, expected)
+
 
 if __name__ == "__main__":
     unittest.main()